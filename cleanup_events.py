@@ -5,135 +5,154 @@ Handles pagination
 """
 
 import asyncio
-import os
+import re
+from typing import Callable, Optional
 from urllib.parse import quote
-from azure.identity import DeviceCodeCredential, ClientSecretCredential
+from azure.identity import DeviceCodeCredential
 from msgraph import GraphServiceClient
+from msgraph.generated.models.event import Event
 from msgraph.generated.models.event_collection_response import EventCollectionResponse
 from kiota_abstractions.request_information import RequestInformation
 from kiota_abstractions.method import Method
 from dotenv import load_dotenv
 
+from config import APP_SCOPE, create_app_credential, load_test_attendees
+from graph_utils import chunked, create_graph_client, send_batch
+
 load_dotenv()
 
 SCOPES = ["Calendars.Read.Shared", "Calendars.ReadWrite", "User.Read"]
+FETCH_CONCURRENCY = 8
 
 
-def load_test_attendees() -> list:
-    raw_value = os.getenv("TEST_ATTENDEES", "")
-    attendees = [item.strip() for item in raw_value.split(",") if item.strip()]
-    if not attendees:
-        raise ValueError("TEST_ATTENDEES is required. Provide a comma-separated list in .env.")
-    return attendees
-
 def get_graph_client(use_device_code: bool = True, use_app_permissions: bool = False) -> GraphServiceClient:
     """Initialize Graph client."""
     if use_app_permissions:
-        tenant_id = os.getenv("AZURE_TENANT_ID")
-        client_id = os.getenv("AZURE_CLIENT_ID")
-        client_secret = os.getenv("AZURE_CLIENT_SECRET")
-        # Application permissions can de
-        credential = ClientSecretCredential(
-            tenant_id=tenant_id,
-            client_id=client_id,
-            client_secret=client_secret
-        )
-        return GraphServiceClient(credentials=credential, scopes=["https://graph.microsoft.com/.default"])
+        return create_graph_client(create_app_credential(), [APP_SCOPE])
 
     credential = DeviceCodeCredential(
         client_id="03836660-f561-40f4-879f-8d067652de12",
         tenant_id="e25fc136-055d-41d0-9503-83f9c657cbea"
     )
-    return GraphServiceClient(credentials=credential, scopes=SCOPES)
+    return create_graph_client(credential, SCOPES)
+
 
+async def _fetch_events_for_user(client: GraphServiceClient, user_id: str, keyword: str,
+                                 match: Callable[[Event], bool]):
+    """Fetch events whose subject contains keyword using /users/{id}/events with a server-side $filter and paging.
 
-async def _fetch_events_for_user(client: GraphServiceClient, user_id: str):
-    """Fetch events using /users/{id}/events with paging (client-side filter later)."""
-    all_events = []
+    Each page is filtered with `match` as it arrives. Returns (matching events, number of candidate events the server returned).
+    """
+    matching_events = []
+    fetched = 0
 
     def _extend_events(page):
+        nonlocal fetched
         if page and page.value:
-            all_events.extend(page.value)
+            fetched += len(page.value)
+            matching_events.extend(e for e in page.value if match(e))
 
     base_url = f"https://graph.microsoft.com/v1.0/users/{quote(user_id)}/events"
-    first_url = f"{base_url}?$select=id,subject&$top=1000"
+    escaped_keyword = keyword.replace("'", "''")
+    subject_filter = quote(f"contains(subject,'{escaped_keyword}')")
+    first_url = f"{base_url}?$filter={subject_filter}&$select=id,subject&$top=999"
 
-    request_info = RequestInformation()
-    request_info.http_method = Method.GET
-    request_info.url = first_url
-
-    events_page = await client.request_adapter.send_async(
-        request_info,
-        EventCollectionResponse,
-        None
-    )
-    _extend_events(events_page)
-
-    next_link = getattr(events_page, "odata_next_link", None)
-    while next_link:
+    async def _get_page(url: str):
         request_info = RequestInformation()
         request_info.http_method = Method.GET
-        request_info.url = next_link
-        events_page = await client.request_adapter.send_async(
+        request_info.url = url
+        return await client.request_adapter.send_async(
             request_info,
             EventCollectionResponse,
             None
         )
-        _extend_events(events_page)
+
+    # Request the next page before processing the current one so paging overlaps.
+    events_page = await _get_page(first_url)
+    while events_page:
         next_link = getattr(events_page, "odata_next_link", None)
+        next_page = asyncio.create_task(_get_page(next_link)) if next_link else None
+        _extend_events(events_page)
+        events_page = await next_page if next_page else None
+
+    return matching_events, fetched
+
 
-    return all_events
+async def _fetch_events_for_users(client: GraphServiceClient, user_list: list, keyword: str,
+                                  match: Callable[[Event], bool]) -> dict:
+    """Fetch events for all users concurrently. Failed users map to their exception."""
+    semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+    async def _fetch(user_id: str):
+        async with semaphore:
+            return await _fetch_events_for_user(client, user_id, keyword, match)
+
+    results = await asyncio.gather(*(_fetch(user_id) for user_id in user_list), return_exceptions=True)
+    return dict(zip(user_list, results))
 
 
 async def cleanup_test_events(client: GraphServiceClient, attendees: list, keyword: str = "TEST_502"):
     """Delete all events containing keyword from attendee calendars and admin mailbox."""
     total_deleted = 0
     total_failed = 0
-    total_scanned = 0
+    total_fetched = 0
 
     print(f"\nCleaning up events containing '{keyword}' from all calendars...\n")
-    user_list = attendees
+    # Duplicate entries would otherwise be processed twice against the same event list
+    user_list = list(dict.fromkeys(attendees))
+    keyword_pattern = re.compile(re.escape(keyword), re.IGNORECASE)
+    events_by_user = await _fetch_events_for_users(
+        client, user_list, keyword,
+        match=lambda e: bool(e.subject and keyword_pattern.search(e.subject))
+    )
 
     for user_id in user_list:
         print(f"Processing: {user_id}")
         try:
-            all_events = await _fetch_events_for_user(client, user_id)
-            if not all_events:
-                print("  No events found.")
+            user_result = events_by_user[user_id]
+            if isinstance(user_result, Exception):
+                raise user_result
+            matching_events, fetched = user_result
+            if not fetched:
+                print("  No matching events found.")
                 continue
 
-            total_scanned += len(all_events)
-            keyword_lower = keyword.lower()
-            matching_events = [
-                e for e in all_events
-                if e.subject and keyword_lower in e.subject.lower()
-            ]
-            print(f"  Found {len(all_events)} events, {len(matching_events)} matching.")
-
-            for event in matching_events:
-                try:
-                    await client.users.by_user_id(user_id).events.by_event_id(event.id).delete()
-                    total_deleted += 1
-                except Exception as e:
-                    total_failed += 1
-                    print(f"    ✗ Failed: {event.subject} ({str(e)[:80]})")
+            total_fetched += fetched
+            print(f"  Fetched {fetched} candidate events, {len(matching_events)} matching.")
+
+            for event_batch in chunked(matching_events):
+                requests = [
+                    {"id": str(i), "method": "DELETE", "url": f"/users/{quote(user_id)}/events/{event.id}"}
+                    for i, event in enumerate(event_batch)
+                ]
+                responses = await send_batch(client, requests)
+
+                for i, event in enumerate(event_batch):
+                    response = responses.get(str(i), {})
+                    status = response.get("status", 0)
+                    if 200 <= status < 300:
+                        total_deleted += 1
+                    else:
+                        total_failed += 1
+                        error = (response.get("body") or {}).get("error", {}).get("message", "")
+                        print(f"    ✗ Failed: {event.subject} (status={status} {error[:80]})")
         except Exception as e:
             msg = str(e)[:120]
             print(f"  ✗ Error: {msg}")
 
     print(f"\n{'='*60}")
     print("✅ Cleanup complete:")
-    print(f"   Scanned: {total_scanned}")
+    print(f"   Fetched: {total_fetched}")
     print(f"   Deleted: {total_deleted}")
     print(f"   Failed: {total_failed}")
     print(f"{'='*60}\n")
 
-    return {"deleted": total_deleted, "failed": total_failed, "scanned": total_scanned}
+    return {"deleted": total_deleted, "failed": total_failed, "fetched": total_fetched}
 
 
-async def main():
+async def main(client: Optional[GraphServiceClient] = None):
     print("\n=== Cleanup TEST_502 Events ===\n")
-    client = get_graph_client(use_app_permissions=True)
+    client = client or get_graph_client(use_app_permissions=True)
     attendees = load_test_attendees()
     await cleanup_test_events(client, attendees, keyword="TEST_502")
 
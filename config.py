@@ -0,0 +1,75 @@
+"""
+Shared configuration loaded from the environment (.env).
+"""
+
+import functools
+import os
+import re
+from typing import Tuple
+
+from azure.core.exceptions import ClientAuthenticationError
+from azure.identity import ClientSecretCredential, TokenCachePersistenceOptions
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_ATTENDEE_SEPARATOR = re.compile(r"\s*,\s*")
+
+APP_SCOPE = "https://graph.microsoft.com/.default"
+TOKEN_CACHE_NAME = "graph-poc"
+_CACHE_ENCRYPTION_ERROR = "Cache encryption is impossible"
+
+
+@functools.lru_cache(maxsize=1)
+def load_test_attendees() -> Tuple[str, ...]:
+    """Parse TEST_ATTENDEES once; later calls return the cached tuple."""
+    raw_value = os.getenv("TEST_ATTENDEES", "").strip()
+    attendees = tuple(item for item in _ATTENDEE_SEPARATOR.split(raw_value) if item)
+    if not attendees:
+        raise ValueError("TEST_ATTENDEES is required. Provide a comma-separated list in .env.")
+    return attendees
+
+
+def _is_cache_encryption_error(error: BaseException) -> bool:
+    # azure-identity raises a ValueError for an unusable libsecret and may wrap it in ClientAuthenticationError
+    while error is not None:
+        if _CACHE_ENCRYPTION_ERROR in str(error):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def create_app_credential() -> ClientSecretCredential:
+    """App-only credential that persists tokens across runs when the cache can be stored.
+
+    The persistent cache is encrypted by the OS (libsecret on Linux). Set
+    TOKEN_CACHE_ALLOW_UNENCRYPTED=true to allow a plain-text cache where encryption is unavailable;
+    otherwise the credential falls back to the in-memory cache. Other authentication and network
+    errors are raised as-is.
+
+    Acquires a token synchronously to open the cache. Call it while setting up a client, before any
+    Graph requests are in flight, since it blocks the event loop for one token request.
+    """
+    credential_args = {
+        "tenant_id": os.getenv("AZURE_TENANT_ID"),
+        "client_id": os.getenv("AZURE_CLIENT_ID"),
+        "client_secret": os.getenv("AZURE_CLIENT_SECRET"),
+    }
+    allow_unencrypted = os.getenv("TOKEN_CACHE_ALLOW_UNENCRYPTED", "").lower() in ("1", "true", "yes")
+    credential = ClientSecretCredential(
+        **credential_args,
+        cache_persistence_options=TokenCachePersistenceOptions(
+            name=TOKEN_CACHE_NAME,
+            allow_unencrypted_storage=allow_unencrypted,
+        ),
+    )
+    try:
+        # The persistent cache is only opened on first use, so probe it here
+        credential.get_token(APP_SCOPE)
+        return credential
+    except (ClientAuthenticationError, ValueError) as e:
+        if not _is_cache_encryption_error(e):
+            raise
+        print("  ⚠ Token cache encryption unavailable (libsecret missing), using in-memory cache. "
+              "Set TOKEN_CACHE_ALLOW_UNENCRYPTED=true to persist it unencrypted.")
+        return ClientSecretCredential(**credential_args)
@@ -1,6 +1,6 @@
-import json
+import orjson
 
-with open('api_result.json') as f:
-    data = json.load(f)
+with open('api_result.json', 'rb') as f:
+    data = orjson.loads(f.read())
     count = len(data['data']['meetingTimeSuggestions'])
     print(f'Total meeting time suggestions (candidates): {count}')
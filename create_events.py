@@ -4,98 +4,123 @@ Requires AZURE_TENANT_ID, AZURE_CLIENT_ID, AZURE_CLIENT_SECRET.
 """
 
 import asyncio
-import os
+import logging
+import queue
+import sys
 from datetime import datetime, timedelta
-from typing import List, Dict
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Dict, Optional, Tuple
+from urllib.parse import quote
 
-from azure.identity import ClientSecretCredential
 from msgraph import GraphServiceClient
-from msgraph.generated.models.event import Event
-from msgraph.generated.models.date_time_time_zone import DateTimeTimeZone
 from dotenv import load_dotenv
 
+from config import APP_SCOPE, create_app_credential, load_test_attendees
+from graph_utils import chunked, create_graph_client, send_batch
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 
-def load_test_attendees() -> List[str]:
-    raw_value = os.getenv("TEST_ATTENDEES", "")
-    attendees = [item.strip() for item in raw_value.split(",") if item.strip()]
-    if not attendees:
-        raise ValueError("TEST_ATTENDEES is required. Provide a comma-separated list in .env.")
-    return attendees
+# Constant part of every event-creation sub-request; copied and filled per slot.
+EVENT_REQUEST_TEMPLATE = {"method": "POST", "headers": {"Content-Type": "application/json"}}
 
 
 def get_app_client() -> GraphServiceClient:
-    tenant_id = os.getenv("AZURE_TENANT_ID")
-    client_id = os.getenv("AZURE_CLIENT_ID")
-    client_secret = os.getenv("AZURE_CLIENT_SECRET")
-    credential = ClientSecretCredential(
-        tenant_id=tenant_id,
-        client_id=client_id,
-        client_secret=client_secret,
-    )
-    return GraphServiceClient(credentials=credential, scopes=["https://graph.microsoft.com/.default"])
+    return create_graph_client(create_app_credential(), [APP_SCOPE])
 
 
 def generate_time_slots(start_date: datetime, num_days: int = 30, slot_minutes: int = 30) -> List[Dict]:
     """Generate test time slots covering all hours (unrestricted)."""
-    slots = []
-    current = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-    for day in range(num_days):
-        date = current + timedelta(days=day)
-        for start_hour in range(0, 24, 1):
-            start_dt = date.replace(hour=start_hour, minute=0)
-            end_dt = start_dt + timedelta(minutes=slot_minutes)
-            slots.append({
-                "start": start_dt.isoformat(),
-                "end": end_dt.isoformat(),
-            })
-    return slots
-
-
-async def create_test_events(client: GraphServiceClient, attendees: List[str], slots: List[Dict], subject_prefix="TEST_502_", log_every: int = 50):
-    created = 0
-    errors = 0
-
-    for attendee in attendees:
-        per_user_created = 0
-        per_user_errors = 0
-        print(f"Creating events for {attendee} ({len(slots)} slots)...")
-        for i, slot in enumerate(slots, start=1):
-            try:
-                event = Event()
-                event.subject = f"{subject_prefix}{attendee.split('@')[0]}_{i}"
-
-                start_time = DateTimeTimeZone()
-                start_time.date_time = slot["start"]
-                start_time.time_zone = "UTC"
-                event.start = start_time
-
-                end_time = DateTimeTimeZone()
-                end_time.date_time = slot["end"]
-                end_time.time_zone = "UTC"
-                event.end = end_time
-
-                await client.users.by_user_id(attendee).events.post(event)
-                created += 1
+    # One slot per hour, every day including weekends - unrestricted domain
+    base = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    step = timedelta(hours=1)
+    duration = timedelta(minutes=slot_minutes)
+    starts = [base + step * i for i in range(num_days * 24)]
+    return [{"start": start.isoformat(), "end": (start + duration).isoformat()} for start in starts]
+
+
+async def _create_events_for_attendee(client: GraphServiceClient, attendee: str, slots: List[Dict],
+                                     subject_prefix: str, log_every: int) -> Tuple[int, int]:
+    """Create one event per slot in the attendee's calendar, 20 events per $batch call."""
+    per_user_created = 0
+    per_user_errors = 0
+    logger.info("Creating events for %s (%d slots)...", attendee, len(slots))
+
+    user_name = attendee.split('@')[0]
+    url = f"/users/{quote(attendee)}/events"
+    requests = []
+    for i, slot in enumerate(slots, start=1):
+        request = EVENT_REQUEST_TEMPLATE.copy()
+        request["id"] = str(i)
+        request["url"] = url
+        request["body"] = {
+            "subject": f"{subject_prefix}{user_name}_{i}",
+            "start": {"dateTime": slot["start"], "timeZone": "UTC"},
+            "end": {"dateTime": slot["end"], "timeZone": "UTC"},
+        }
+        requests.append(request)
+
+    processed = 0
+    for request_batch in chunked(requests):
+        # Event creation is not idempotent, so a possibly-processed batch is never resent
+        responses = await send_batch(client, request_batch, idempotent=False)
+
+        for request in request_batch:
+            status = responses.get(request["id"], {}).get("status", 0)
+            if 200 <= status < 300:
                 per_user_created += 1
-            except Exception:
-                errors += 1
+            else:
                 per_user_errors += 1
 
-            if i % log_every == 0:
-                print(f"  {attendee}: {i}/{len(slots)} processed (ok={per_user_created}, err={per_user_errors})")
+        previous = processed
+        processed += len(request_batch)
+        if processed // log_every > previous // log_every:
+            logger.info("  %s: %d/%d processed (ok=%d, err=%d)", attendee, processed, len(slots), per_user_created, per_user_errors)
 
-        print(f"  Done {attendee}: ok={per_user_created}, err={per_user_errors}")
+    logger.info("  Done %s: ok=%d, err=%d", attendee, per_user_created, per_user_errors)
+    return per_user_created, per_user_errors
+
+
+async def create_test_events(client: GraphServiceClient, attendees: List[str], slots: List[Dict], subject_prefix="TEST_502_", log_every: int = 50):
+    results = await asyncio.gather(*(
+        _create_events_for_attendee(client, attendee, slots, subject_prefix, log_every)
+        for attendee in attendees
+    ))
+    created = sum(ok for ok, _ in results)
+    errors = sum(err for _, err in results)
 
     return {"created": created, "errors": errors}
 
 
-async def main():
-    client = get_app_client()
-    slots = generate_time_slots(datetime.now(), num_days=60, slot_minutes=30)
-    attendees = load_test_attendees()
-    result = await create_test_events(client, attendees, slots, log_every=50)
+def start_log_listener() -> Tuple[QueueHandler, QueueListener]:
+    """Route progress logging through a queue so stdout writes happen on a background thread.
+
+    The caller must stop the listener and remove the returned handler from `logger` when done.
+    """
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(message)s"))
+    queue_handler = QueueHandler(log_queue)
+    logger.addHandler(queue_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    listener = QueueListener(log_queue, stream_handler)
+    listener.start()
+    return queue_handler, listener
+
+
+async def main(client: Optional[GraphServiceClient] = None):
+    queue_handler, listener = start_log_listener()
+    try:
+        client = client or get_app_client()
+        slots = generate_time_slots(datetime.now(), num_days=60, slot_minutes=30)
+        attendees = load_test_attendees()
+        result = await create_test_events(client, attendees, slots, log_every=50)
+    finally:
+        listener.stop()
+        logger.removeHandler(queue_handler)
     print(f"Created: {result['created']} events, Errors: {result['errors']}")
 
 
@@ -1,10 +1,11 @@
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional
 from pathlib import Path
 import asyncio
-import json
+import math
 import time
 import os
+import orjson
 from azure.identity import DeviceCodeCredential, InteractiveBrowserCredential
 from msgraph import GraphServiceClient
 from msgraph.generated.users.item.find_meeting_times.find_meeting_times_post_request_body import FindMeetingTimesPostRequestBody
@@ -15,20 +16,16 @@ from msgraph.generated.models.time_slot import TimeSlot
 from msgraph.generated.models.date_time_time_zone import DateTimeTimeZone
 from msgraph.generated.models.attendee_type import AttendeeType
 from msgraph.generated.models.activity_domain import ActivityDomain
+from kiota_abstractions.base_request_configuration import RequestConfiguration
 from dotenv import load_dotenv
 
-load_dotenv()
-
-
-def load_test_attendees() -> List[str]:
-    raw_value = os.getenv("TEST_ATTENDEES", "")
-    attendees = [item.strip() for item in raw_value.split(",") if item.strip()]
-    if not attendees:
-        raise ValueError("TEST_ATTENDEES is required. Provide a comma-separated list in .env.")
-    return attendees
+from config import load_test_attendees
+from graph_utils import NO_MIDDLEWARE_RETRY, create_graph_client, with_retry
 
+load_dotenv()
 
 SCOPES = ["Calendars.Read.Shared", "Calendars.ReadWrite", "User.Read"]
+MITIGATION_CONCURRENCY = 10
 
 
 def get_graph_client(use_device_code: bool = True) -> GraphServiceClient:
@@ -48,7 +45,7 @@ def get_graph_client(use_device_code: bool = True) -> GraphServiceClient:
             tenant_id=os.getenv("AZURE_TENANT_ID")
         )
     
-    return GraphServiceClient(credentials=credential, scopes=SCOPES)
+    return create_graph_client(credential, SCOPES)
 
 
 def batch_attendees(attendees: List[str], batch_size: int = 5) -> List[List[str]]:
@@ -56,20 +53,31 @@ def batch_attendees(attendees: List[str], batch_size: int = 5) -> List[List[str]
     return [attendees[i:i + batch_size] for i in range(0, len(attendees), batch_size)]
 
 
-def chunk_dates(start: datetime, end: datetime, days: int = 3) -> List[tuple]:
+def chunk_dates(start: datetime, end: datetime, days: int = 3) -> Iterator[tuple]:
     """Split date range into chunks."""
-    chunks = []
     current = start
     while current < end:
         chunk_end = min(current + timedelta(days=days), end)
-        chunks.append((current, chunk_end))
+        yield current, chunk_end
         current = chunk_end
-    return chunks
+
+
+@with_retry
+async def _post_find_meeting_times_with_retry(client: GraphServiceClient, request_body: FindMeetingTimesPostRequestBody):
+    return await client.me.find_meeting_times.post(
+        request_body, request_configuration=RequestConfiguration(options=[NO_MIDDLEWARE_RETRY])
+    )
 
 
 async def call_findmeetingtimes(client: GraphServiceClient, attendees: List[str], start: str, end: str, 
-                          duration: int = 60, max_candidates: int = 50, save_debug: bool = False) -> Dict:
-    """Call Graph API findMeetingTimes endpoint using SDK."""
+                          duration: int = 60, max_candidates: int = 50, save_debug: bool = False,
+                          retry: bool = True, return_raw: bool = False) -> Dict:
+    """Call Graph API findMeetingTimes endpoint using SDK.
+    
+    Args:
+        retry: If True, throttled and transient gateway errors are retried with backoff.
+        return_raw: If True, "data" is the SDK result object instead of a JSON-ready dict.
+    """
     try:
         # Build attendee list
         attendee_list = []
@@ -107,15 +115,20 @@ async def call_findmeetingtimes(client: GraphServiceClient, attendees: List[str]
         request_body.is_organizer_optional = True
         
         # Call API
-        result = await client.me.find_meeting_times.post(request_body)
+        if retry:
+            result = await _post_find_meeting_times_with_retry(client, request_body)
+        else:
+            result = await client.me.find_meeting_times.post(request_body)
 
         # Store original API response for debugging (only when requested)
         if save_debug:
             # Note: SDK returns objects, so we extract all available properties
+            # @odata.context is not a model property, so the SDK keeps it in additional_data
+            additional_data = result.additional_data or {}
             raw_response = {
-                "odata_context": getattr(result, 'odata_context', None),
-                "odata_type": getattr(result, 'odata_type', None),
-                "additional_data": result.additional_data if hasattr(result, 'additional_data') else {},
+                "odata_context": additional_data.get("@odata.context"),
+                "odata_type": result.odata_type,
+                "additional_data": additional_data,
                 "emptySuggestionsReason": result.empty_suggestions_reason,
                 "meetingTimeSuggestions": [],
                 "_debug_total_count": len(result.meeting_time_suggestions) if result.meeting_time_suggestions else 0
@@ -125,11 +138,11 @@ async def call_findmeetingtimes(client: GraphServiceClient, attendees: List[str]
             if result.meeting_time_suggestions:
                 for item in result.meeting_time_suggestions:
                     suggestion = {
-                        "odata_type": getattr(item, 'odata_type', None),
+                        "odata_type": item.odata_type,
                         "confidence": item.confidence,
                         "organizerAvailability": item.organizer_availability,
                         "suggestionReason": item.suggestion_reason,
-                        "additional_data": item.additional_data if hasattr(item, 'additional_data') else {},
+                        "additional_data": item.additional_data or {},
                     }
                     
                     if item.meeting_time_slot:
@@ -159,17 +172,20 @@ async def call_findmeetingtimes(client: GraphServiceClient, attendees: List[str]
                     if item.locations:
                         suggestion["locations"] = [
                             {
-                                "displayName": loc.display_name if hasattr(loc, 'display_name') else None
+                                "displayName": loc.display_name
                             } for loc in item.locations
                         ]
                     
                     raw_response["meetingTimeSuggestions"].append(suggestion)
             
             result_file_path = Path(__file__).parent / "raw_api_response.json"
-            with open(result_file_path, "w", encoding="utf-8") as f:
-                json.dump(raw_response, f, indent=2)
+            # Write off the event loop so disk I/O does not block other in-flight calls
+            await asyncio.to_thread(result_file_path.write_bytes, orjson.dumps(raw_response, option=orjson.OPT_INDENT_2))
             print(f"  📄 Raw API response saved to: {result_file_path} ({len(result.meeting_time_suggestions or [])} suggestions)")
         
+        if return_raw:
+            return {"status": 200, "data": result}
+
         return {
             "status": 200,
             "data": {
@@ -196,38 +212,14 @@ async def call_findmeetingtimes(client: GraphServiceClient, attendees: List[str]
         return {"status": 500, "data": str(e)}
 
 
-def generate_time_slots(start_date: datetime, num_days: int = 30, slot_minutes: int = 30) -> List[Dict]:
-    """Generate test time slots covering all hours (unrestricted)."""
-    slots = []
-    current = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    for day in range(num_days):
-        date = current + timedelta(days=day)
-        # Include weekends too - unrestricted domain
-        for start_hour in range(0, 24, 1):  # Every hour, all day
-            start_dt = date.replace(hour=start_hour, minute=0)
-            end_dt = start_dt + timedelta(minutes=slot_minutes)
-            slots.append({
-                "start": start_dt.isoformat(),
-                "end": end_dt.isoformat()
-            })
-    return slots
-
-
-def show_mitigation_math(num_attendees: int, batch_size: int = 5, days_per_chunk: int = 3):
+def show_mitigation_math(num_attendees: int, batch_size: int = 5, days_per_chunk: int = 3, num_days: int = 30):
     """Show mitigation strategy: how many API calls needed."""
-    attendees = load_test_attendees()[:num_attendees]
-    slots = generate_time_slots(datetime.now(), 30)
-    
-    batches = batch_attendees(attendees, batch_size)
+    num_batches = math.ceil(num_attendees / batch_size)
+    num_chunks = math.ceil(num_days / days_per_chunk)
     
-    start = datetime.fromisoformat(slots[0]["start"])
-    end = datetime.fromisoformat(slots[-1]["end"])
-    chunks = chunk_dates(start, end, days_per_chunk)
+    total_calls = num_batches * num_chunks
     
-    total_calls = len(batches) * len(chunks)
-    
-    print(f"{num_attendees} attendees → {len(batches)} batches × {len(chunks)} chunks = {total_calls} API calls")
+    print(f"{num_attendees} attendees → {num_batches} batches × {num_chunks} chunks = {total_calls} API calls")
 
 
 async def test_calendar_access(client: GraphServiceClient, attendees: List[str]):
@@ -254,14 +246,14 @@ async def reproduce_bad_gateway(client: GraphServiceClient):
     result = await call_findmeetingtimes(
         client, load_test_attendees(),
         datetime(2026, 1, 29).isoformat(), datetime(2026, 12, 30).isoformat(),
-        duration=10, max_candidates=1600, save_debug=True
+        duration=10, max_candidates=1600, save_debug=True, retry=False
     )
     
     root_path = Path(__file__).parent
     result_path = root_path / "api_result.json"
     
-    with open(result_path, "w", encoding="utf-8") as f:
-        json.dump(result, f, indent=2)
+    with open(result_path, "wb") as f:
+        f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
     print(f"  ✓ Result saved to: {result_path}")
     print(f"  Result: Status {result['status']}")
     if result['status'] != 200:
@@ -293,24 +285,33 @@ async def run_mitigation(client: GraphServiceClient, attendees: List[str], start
                    max_candidates: int = 50) -> Dict:
     """Execute full mitigation: batch + chunk + call findMeetingTimes."""
     batches = batch_attendees(attendees, batch_size)
-    chunks = chunk_dates(start, end, days_per_chunk)
-    
-    results = []
-    successful = 0
-    failed = 0
+    # Format each chunk boundary once instead of once per batch
+    chunks = [
+        (chunk_start.isoformat(), chunk_end.isoformat())
+        for chunk_start, chunk_end in chunk_dates(start, end, days_per_chunk)
+    ]
     
-    for batch in batches:
-        for chunk_start, chunk_end in chunks:
-            result = await call_findmeetingtimes(
+    semaphore = asyncio.Semaphore(MITIGATION_CONCURRENCY)
+
+    async def _call(batch: List[str], chunk_start: str, chunk_end: str) -> Dict:
+        async with semaphore:
+            return await call_findmeetingtimes(
                 client, batch,
-                chunk_start.isoformat(), chunk_end.isoformat(),
-                duration, max_candidates
+                chunk_start, chunk_end,
+                duration, max_candidates, return_raw=True
             )
-            results.append(result)
-            if result["status"] == 200:
-                successful += 1
-            else:
-                failed += 1
+
+    results = await asyncio.gather(*(
+        _call(batch, chunk_start, chunk_end)
+        for batch in batches
+        for chunk_start, chunk_end in chunks
+    ), return_exceptions=True)
+    results = [
+        {"status": 500, "data": str(result)} if isinstance(result, Exception) else result
+        for result in results
+    ]
+    successful = sum(1 for result in results if result["status"] == 200)
+    failed = len(results) - successful
     
     return {
         "total_calls": len(results),
@@ -321,7 +322,7 @@ async def run_mitigation(client: GraphServiceClient, attendees: List[str], start
     }
 
 
-async def main():
+async def main(client: Optional[GraphServiceClient] = None):
     start_time = time.time()
     print("\n=== FINDMEETINGTIMES 502 BAD GATEWAY MITIGATION POC ===")
     print(f"Start time: {datetime.now().strftime('%H:%M:%S')}")
@@ -329,7 +330,7 @@ async def main():
     print("\n[0] STRATEGY CALCULATION")
     show_mitigation_math(25, batch_size=5, days_per_chunk=3)
     
-    client = get_graph_client(use_device_code=True)
+    client = client or get_graph_client(use_device_code=True)
 
     print("\n[1] REPRODUCING 502 BAD GATEWAY")
     t1 = time.time()
@@ -358,23 +359,27 @@ async def main():
     print("=== END OF POC ===\n")
 
 
+def print_error(e: Exception):
+    """Print a failure, with setup hints for common AADSTS sign-in errors."""
+    msg = str(e)
+    print("\n" + "="*60)
+    print("\nError occurred:")
+    if "AADSTS7000218" in msg:
+        print("   AADSTS7000218: App is confidential. Create/use a PUBLIC client app.")
+        print("   - Enable 'Allow public client flows' in Azure AD app")
+        print("   - Add redirect URI: http://localhost:8400")
+        print("   - Do NOT require client_secret for browser auth")
+    elif "AADSTS500113" in msg:
+        print("   AADSTS500113: Redirect URI not registered.")
+        print("   - Add redirect URI: http://localhost:8400")
+    else:
+        print(f"   {msg[:200]}")
+
+
 if __name__ == "__main__":
     import sys
     try:
         asyncio.run(main())
     except Exception as e:
-        msg = str(e)
-        print("\n" + "="*60)
-        print("\nError occurred:")
-        if "AADSTS7000218" in msg:
-            print("   AADSTS7000218: App is confidential. Create/use a PUBLIC client app.")
-            print("   - Enable 'Allow public client flows' in Azure AD app")
-            print("   - Add redirect URI: http://localhost:8400")
-            print("   - Do NOT require client_secret for browser auth")
-        elif "AADSTS500113" in msg:
-            print("   AADSTS500113: Redirect URI not registered.")
-            print("   - Add redirect URI: http://localhost:8400")
-        else:
-            print(f"   {msg[:200]}")
+        print_error(e)
         sys.exit(1)
-
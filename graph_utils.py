@@ -0,0 +1,206 @@
+"""
+Shared helpers for Microsoft Graph: pooled HTTP/2 client, rate-limited retries and JSON batching ($batch).
+Up to 20 sub-requests are sent per batch call; throttled or transiently failing sub-requests are resent
+after Retry-After, or after exponential backoff with jitter when the header is absent.
+"""
+
+import asyncio
+import functools
+import json
+import random
+import time
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+from msgraph import GraphServiceClient
+from msgraph.graph_request_adapter import GraphRequestAdapter, options as graph_request_options
+from msgraph_core import GraphClientFactory
+from kiota_abstractions.api_error import APIError
+from kiota_abstractions.request_information import RequestInformation
+from kiota_abstractions.method import Method
+from kiota_http.middleware.options import RetryHandlerOption
+from kiota_authentication_azure.azure_identity_authentication_provider import AzureIdentityAuthenticationProvider
+
+GRAPH_BATCH_URL = "https://graph.microsoft.com/v1.0/$batch"
+MAX_BATCH_SIZE = 20
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+# For non-idempotent requests (event creation), retry only failures where the server did not process
+# the request; a 502/504 or read timeout may arrive after the events were already created.
+NON_IDEMPOTENT_RETRY_STATUS_CODES = {429, 503}
+NON_IDEMPOTENT_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+MAX_RETRIES = 4
+RETRY_BASE_SECONDS = 1.0
+RETRY_CAP_SECONDS = 30.0
+
+# Request option for calls wrapped by with_retry, so the SDK middleware does not retry underneath it.
+# Other calls keep the middleware's default 429/503/504 retry.
+NO_MIDDLEWARE_RETRY = RetryHandlerOption(max_retries=0, should_retry=False)
+
+
+def create_graph_client(credential, scopes: List[str],
+                        transport: Optional[httpx.AsyncBaseTransport] = None) -> GraphServiceClient:
+    """Build a Graph client on an HTTP/2 connection pool whose idle connections are kept alive for 5 minutes.
+
+    The SDK's default middleware options are kept, including the URL replacement that maps
+    `/users/me-token-to-replace` to `/me`.
+    """
+    http_client = GraphClientFactory.create_with_default_middleware(
+        client=httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=300),
+            # Same as kiota's default client; a shorter read timeout would preempt the gateway's 502
+            timeout=httpx.Timeout(100.0, connect=30.0),
+            transport=transport,
+        ),
+        options=graph_request_options,
+    )
+    auth_provider = AzureIdentityAuthenticationProvider(credential, scopes=scopes)
+    return GraphServiceClient(request_adapter=GraphRequestAdapter(auth_provider, http_client))
+
+
+def chunked(items: List, size: int = MAX_BATCH_SIZE) -> Iterator[List]:
+    """Split items into lists of at most `size` elements."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class TokenBucket:
+    """Async rate limiter: allows bursts of `capacity` calls, refilling one token every `refill_interval` seconds."""
+
+    def __init__(self, capacity: int = 10, refill_interval: float = 0.1):
+        self._capacity = capacity
+        self._refill_interval = refill_interval
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            elapsed = time.monotonic() - self._updated
+            refill = int(elapsed / self._refill_interval)
+            if refill:
+                self._tokens = min(self._capacity, self._tokens + refill)
+                self._updated += refill * self._refill_interval
+                elapsed -= refill * self._refill_interval
+            if self._tokens:
+                self._tokens -= 1
+                return
+            await asyncio.sleep(self._refill_interval - elapsed)
+
+
+_rate_limiter = TokenBucket()
+
+
+def _backoff_seconds(attempt: int) -> float:
+    return min(RETRY_CAP_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def _retry_after_seconds(headers) -> Optional[float]:
+    for name, value in (headers or {}).items():
+        if name.lower() == "retry-after":
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def _error_status_and_headers(error: Exception):
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code, error.response.headers
+    if isinstance(error, APIError):
+        return error.response_status_code, error.response_headers
+    return None, None
+
+
+def with_retry(func=None, *, retry_statuses=RETRY_STATUS_CODES, retry_errors=(httpx.TransportError,)):
+    """Rate-limit an async Graph call and retry it on `retry_statuses` and `retry_errors`.
+
+    By default that is throttling, 5xx gateway errors and any transport error. Waits for Retry-After
+    when the response provides it, otherwise for an exponential backoff with jitter.
+    Usable as `@with_retry` or `with_retry(func, retry_statuses=..., retry_errors=...)`.
+    """
+    if func is None:
+        return functools.partial(with_retry, retry_statuses=retry_statuses, retry_errors=retry_errors)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        for attempt in range(MAX_RETRIES + 1):
+            await _rate_limiter.acquire()
+            try:
+                return await func(*args, **kwargs)
+            except (APIError, httpx.HTTPStatusError, httpx.TransportError) as error:
+                status, headers = _error_status_and_headers(error)
+                retryable = status in retry_statuses if status is not None else isinstance(error, retry_errors)
+                if attempt == MAX_RETRIES or not retryable:
+                    raise
+                retry_after = _retry_after_seconds(headers)
+                await asyncio.sleep(retry_after if retry_after is not None else _backoff_seconds(attempt))
+    return wrapper
+
+
+async def _send_batch_request(client: GraphServiceClient, requests: List[Dict]) -> List[Dict]:
+    request_info = RequestInformation()
+    request_info.http_method = Method.POST
+    request_info.url = GRAPH_BATCH_URL
+    request_info.headers.try_add("Content-Type", "application/json")
+    request_info.add_request_options([NO_MIDDLEWARE_RETRY])
+    request_info.content = json.dumps({"requests": requests}).encode("utf-8")
+
+    payload = await client.request_adapter.send_primitive_async(request_info, "bytes", None)
+    return json.loads(payload).get("responses", []) if payload else []
+
+
+_post_batch = with_retry(_send_batch_request)
+_post_non_idempotent_batch = with_retry(
+    _send_batch_request,
+    retry_statuses=NON_IDEMPOTENT_RETRY_STATUS_CODES,
+    retry_errors=NON_IDEMPOTENT_RETRY_ERRORS,
+)
+
+
+async def send_batch(client: GraphServiceClient, requests: List[Dict], idempotent: bool = True) -> Dict[str, Dict]:
+    """Send up to 20 sub-requests in one $batch call.
+
+    Pass idempotent=False for sub-requests that must not be replayed (e.g. event creation); only
+    failures the server did not process (429/503, connection errors) are then retried.
+
+    Returns the sub-responses keyed by request id. Sub-requests answered with a retryable
+    status are resent after the longest Retry-After in the batch (or a backoff), up to MAX_RETRIES times.
+    If a $batch POST itself fails, responses from earlier rounds are kept and each still-pending
+    sub-request gets a synthetic error response carrying the failure's status (0 if none) and message.
+    """
+    post_batch = _post_batch if idempotent else _post_non_idempotent_batch
+    retry_statuses = RETRY_STATUS_CODES if idempotent else NON_IDEMPOTENT_RETRY_STATUS_CODES
+    requests_by_id = {request["id"]: request for request in requests}
+    pending = list(requests)
+    results = {}
+
+    for attempt in range(MAX_RETRIES + 1):
+        retryable = []
+        wait_seconds = 0.0
+        try:
+            responses = await post_batch(client, pending)
+        except Exception as e:
+            status, _ = _error_status_and_headers(e)
+            for request in pending:
+                results[request["id"]] = {
+                    "id": request["id"],
+                    "status": status or 0,
+                    "body": {"error": {"message": str(e)}},
+                }
+            break
+
+        for response in responses:
+            if response.get("status") in retry_statuses and attempt < MAX_RETRIES:
+                retryable.append(requests_by_id[response["id"]])
+                retry_after = _retry_after_seconds(response.get("headers"))
+                wait_seconds = max(wait_seconds, retry_after if retry_after is not None else _backoff_seconds(attempt))
+            else:
+                results[response["id"]] = response
+
+        if not retryable:
+            break
+        await asyncio.sleep(wait_seconds)
+        pending = retryable
+
+    return results
@@ -0,0 +1,31 @@
+"""
+Run the full POC in one process: create test events -> find meeting times -> clean up.
+Create and cleanup share one app-only client, so its token and connection pool are reused across phases.
+findMeetingTimes calls /me and needs a delegated client, which find_meetings creates itself.
+Cleanup always runs, even if an earlier phase fails, so no TEST_502 events are left behind.
+"""
+
+import asyncio
+import sys
+
+import cleanup_events
+import create_events
+import find_meetings
+
+
+async def run() -> bool:
+    app_client = create_events.get_app_client()
+    try:
+        await create_events.main(app_client)
+        await find_meetings.main()
+    except Exception as e:
+        find_meetings.print_error(e)
+        return False
+    finally:
+        await cleanup_events.main(app_client)
+    return True
+
+
+if __name__ == "__main__":
+    if not asyncio.run(run()):
+        sys.exit(1)
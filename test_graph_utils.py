@@ -0,0 +1,170 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from azure.core.credentials import AccessToken
+from kiota_abstractions.api_error import APIError
+from msgraph.generated.users.item.find_meeting_times.find_meeting_times_post_request_body import FindMeetingTimesPostRequestBody
+
+import graph_utils
+from graph_utils import TokenBucket, create_graph_client, send_batch, with_retry
+
+
+class _StaticCredential:
+    def get_token(self, *scopes, **kwargs):
+        return AccessToken("token", 4102444800)
+
+
+def _mock_client(handler):
+    """Graph client whose requests go to `handler`; returns the client and the list of requests it received."""
+    requests = []
+
+    def record(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return handler(request)
+
+    client = create_graph_client(_StaticCredential(), ["https://graph.microsoft.com/.default"],
+                                 transport=httpx.MockTransport(record))
+    return client, requests
+
+
+def test_me_find_meeting_times_resolves_to_me():
+    client, requests = _mock_client(
+        lambda request: httpx.Response(200, json={"meetingTimeSuggestions": [], "emptySuggestionsReason": ""})
+    )
+    asyncio.run(client.me.find_meeting_times.post(FindMeetingTimesPostRequestBody()))
+
+    assert [str(request.url) for request in requests] == ["https://graph.microsoft.com/v1.0/me/findMeetingTimes"]
+
+
+def test_middleware_retries_unwrapped_calls():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if len(requests) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"id": "user-id"})
+
+    client, requests = _mock_client(handler)
+    user = asyncio.run(client.me.get())
+
+    assert user.id == "user-id"
+    assert len(requests) == 2
+
+
+def _batch_response(*responses) -> httpx.Response:
+    return httpx.Response(200, json={"responses": list(responses)})
+
+
+def _batch_ids(request: httpx.Request) -> list:
+    return [sub_request["id"] for sub_request in json.loads(request.content)["requests"]]
+
+
+BATCH_REQUESTS = [
+    {"id": "0", "method": "DELETE", "url": "/users/u/events/e0"},
+    {"id": "1", "method": "DELETE", "url": "/users/u/events/e1"},
+]
+
+
+def test_send_batch_keeps_partial_results_when_resend_fails():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if len(requests) == 1:
+            return _batch_response(
+                {"id": "0", "status": 204},
+                {"id": "1", "status": 429, "headers": {"Retry-After": "0"}},
+            )
+        return httpx.Response(400, json={"error": {"code": "BadRequest", "message": "bad"}})
+
+    client, requests = _mock_client(handler)
+    results = asyncio.run(send_batch(client, BATCH_REQUESTS))
+
+    assert results["0"]["status"] == 204
+    assert results["1"]["status"] == 400
+    assert [_batch_ids(request) for request in requests] == [["0", "1"], ["1"]]
+
+
+def test_send_batch_retries_without_middleware_retry():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if len(requests) == 1:
+            return _batch_response(
+                {"id": "0", "status": 204},
+                {"id": "1", "status": 429, "headers": {"Retry-After": "0"}},
+            )
+        return httpx.Response(503, headers={"Retry-After": "0"})
+
+    client, requests = _mock_client(handler)
+    results = asyncio.run(send_batch(client, BATCH_REQUESTS))
+
+    assert results["0"]["status"] == 204
+    assert results["1"]["status"] == 503
+    # First round, then MAX_RETRIES + 1 attempts of the resend, each a single HTTP request
+    assert len(requests) == 1 + graph_utils.MAX_RETRIES + 1
+
+
+def test_send_batch_does_not_replay_non_idempotent_batches_on_gateway_errors():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if len(requests) == 1:
+            return _batch_response({"id": "0", "status": 201}, {"id": "1", "status": 504})
+        return httpx.Response(502)
+
+    client, requests = _mock_client(handler)
+    results = asyncio.run(send_batch(client, BATCH_REQUESTS, idempotent=False))
+
+    assert results["0"]["status"] == 201
+    assert results["1"]["status"] == 504
+    assert len(requests) == 1
+
+
+def test_with_retry_retries_transport_errors(monkeypatch):
+    monkeypatch.setattr(graph_utils, "_backoff_seconds", lambda attempt: 0)
+    calls = []
+
+    @with_retry
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise httpx.ConnectError("connection refused")
+        return "ok"
+
+    assert asyncio.run(flaky()) == "ok"
+    assert len(calls) == 3
+
+
+def test_with_retry_raises_non_retryable_status():
+    calls = []
+
+    @with_retry
+    async def bad_request():
+        calls.append(1)
+        raise APIError(message="bad", response_status_code=400)
+
+    with pytest.raises(APIError):
+        asyncio.run(bad_request())
+    assert len(calls) == 1
+
+
+def test_with_retry_does_not_retry_excluded_transport_errors():
+    calls = []
+
+    @with_retry(retry_errors=(httpx.ConnectError,))
+    async def timed_out():
+        calls.append(1)
+        raise httpx.ReadTimeout("read timed out")
+
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(timed_out())
+    assert len(calls) == 1
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(capacity=2, refill_interval=0.05)
+
+    async def acquire_all():
+        for _ in range(5):
+            await bucket.acquire()
+
+    started = time.monotonic()
+    asyncio.run(acquire_all())
+
+    # 2 tokens immediately, then one per refill interval
+    assert time.monotonic() - started >= 3 * 0.05 * 0.9